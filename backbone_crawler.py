@@ -1,5 +1,6 @@
 import argparse
 import asyncio
+import functools
 import json
 import os
 import random
@@ -8,12 +9,14 @@ import time
 from collections import Counter  # <--- Added for aggregation
 from datetime import datetime, timedelta
 
+import orjson
 import pandas as pd
-from google import genai
 from google.genai import types
 from playwright.async_api import async_playwright
 from playwright_stealth import Stealth
 
+from gemini_client import get_client
+
 # --- CONFIGURABLE CONSTANTS ---
 MAX_REVIEWS_PER_CALL = 100  # Beyond this limit we make more than one call.
 REVIEW_COUNT_THRESHOLD = 100  # Threshold to switch between Lite and Flash models.
@@ -36,6 +39,13 @@ REVIEW_YEARS = 2  # Only count reviews from the last N years
 URL_LIST_FILE = "url_list.txt"
 STATE_FILE = "queue_state.json"
 
+JSON_FENCE_RE = re.compile(r"```json\s*|\s*```")
+COORD_LINK_RE = re.compile(r"lat=([-+]?\d*\.\d+|\d+)&lng=([-+]?\d*\.\d+|\d+)")
+
+# We only read text off park4night pages, so skip heavy assets and trackers.
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+BLOCKED_DOMAINS = ("googletagmanager", "doubleclick", "facebook.net", "hotjar", "sentry")
+
 GEMINI_API_KEY = os.environ.get("GOOGLE_API_KEY")
 P4N_USER = os.environ.get("P4N_USERNAME")
 P4N_PASS = os.environ.get("P4N_PASSWORD")
@@ -56,6 +66,28 @@ def is_review_within_years(date_str, years=REVIEW_YEARS):
         return False
 
 
+async def block_non_essential(route):
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(
+        d in request.url for d in BLOCKED_DOMAINS
+    ):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+@functools.lru_cache(maxsize=1)
+def load_system_instruction():
+    """Builds the Gemini prompt from the taxonomy once per run; every place reuses it."""
+    with open(TAXONOMY_FILE, "rb") as f:
+        tax_data = orjson.loads(f.read())
+    pro_taxonomy_block = "\n".join(f"- {item['topic']}: {item['description']}" for item in tax_data.get("pros", []) if isinstance(item, dict))
+    con_taxonomy_block = "\n".join(f"- {item['topic']}: {item['description']}" for item in tax_data.get("cons", []) if isinstance(item, dict))
+
+    with open(LLM_PROMPT_FILE, "r", encoding="utf-8") as f:
+        return f.read().replace("{pro_taxonomy_block}", pro_taxonomy_block).replace("{con_taxonomy_block}", con_taxonomy_block)
+
+
 class PipelineLogger:
     _initialized = False
 
@@ -67,7 +99,7 @@ class PipelineLogger:
                 v.strip().startswith("{") or v.strip().startswith("[")
             ):
                 try:
-                    processed_content[k] = json.loads(v)
+                    processed_content[k] = orjson.loads(v)
                 except:
                     processed_content[k] = v
             else:
@@ -150,7 +182,7 @@ class DailyQueueManager:
             json.dump(state, f)
 
 
-client = genai.Client(api_key=GEMINI_API_KEY)
+client = get_client(GEMINI_API_KEY)
 
 
 class P4NScraper:
@@ -165,6 +197,7 @@ class P4NScraper:
         self.csv_file = DEV_CSV if is_dev else PROD_CSV
         self.processed_batch = []
         self.existing_df = self._load_existing()
+        self._rows = None  # p4n_id -> row, built from existing_df on first save
         self.stats = {
             "read": 0,
             "discarded_fresh": 0,
@@ -185,17 +218,21 @@ class P4NScraper:
                 pass
         return pd.DataFrame()
 
+    def _last_scraped_index(self):
+        # One pass over the catalog so staleness checks are dict lookups per link.
+        index = {}
+        if self.existing_df.empty or "p4n_id" not in self.existing_df.columns:
+            return index
+        for p_id, last_date in zip(
+            self.existing_df["p4n_id"].astype(str), self.existing_df["last_scraped"]
+        ):
+            index.setdefault(p_id, last_date)
+        return index
+
     async def analyze_with_ai(self, raw_data, model_name, url):
         # 1. Setup call stats and Load Taxonomy (Original Logic)
         try:
-            with open(TAXONOMY_FILE, "r", encoding="utf-8") as f:
-                tax_data = json.load(f)
-                pro_list = [f"- {item['topic']}: {item['description']}" for item in tax_data.get("pros", []) if isinstance(item, dict)]
-                con_list = [f"- {item['topic']}: {item['description']}" for item in tax_data.get("cons", []) if isinstance(item, dict)]
-                pro_taxonomy_block, con_taxonomy_block = "\n".join(pro_list), "\n".join(con_list)
-
-            with open(LLM_PROMPT_FILE, "r", encoding="utf-8") as f:
-                system_instruction = f.read().replace("{pro_taxonomy_block}", pro_taxonomy_block).replace("{con_taxonomy_block}", con_taxonomy_block)
+            system_instruction = load_system_instruction()
         except Exception as e:
             ts_print(f"❌ FAILED TO LOAD TAXONOMY OR PROMPT: {e}")
             return {}
@@ -219,7 +256,7 @@ class P4NScraper:
         for chunk_idx, chunk in enumerate(chunks):
             ts_print(f"🤖 [CHUNK {chunk_idx + 1}/{len(chunks)}] Analyzing {len(chunk)} reviews...")
 
-            json_payload = json.dumps(chunk, default=str, ensure_ascii=False)
+            json_payload = orjson.dumps(chunk, default=str).decode()
             
             if model_name == FLASH_MODEL: self.stats["gemini_flash_calls"] += 1
             else: self.stats["gemini_lite_calls"] += 1
@@ -239,8 +276,11 @@ class P4NScraper:
                         config=config,
                     )
 
-                    clean_text = re.sub(r"```json\s*|\s*```", "", response.text).strip()
-                    ai_response_list = json.loads(clean_text)
+                    clean_text = response.text
+                    if "```" in clean_text:
+                        clean_text = JSON_FENCE_RE.sub("", clean_text)
+                    clean_text = clean_text.strip()
+                    ai_response_list = orjson.loads(clean_text)
 
                     if isinstance(ai_response_list, dict):
                         for k in ["reviews", "data", "results", "output"]:
@@ -340,9 +380,7 @@ class P4NScraper:
                     else None
                 )
                 if coord_link:
-                    m = re.search(
-                        r"lat=([-+]?\d*\.\d+|\d+)&lng=([-+]?\d*\.\d+|\d+)", coord_link
-                    )
+                    m = COORD_LINK_RE.search(coord_link)
                     if m:
                         lat, lng = float(m.group(1)), float(m.group(2))
 
@@ -463,6 +501,7 @@ class P4NScraper:
         async with async_playwright() as p:
             browser = await p.chromium.launch(headless=True)
             context = await browser.new_context()
+            await context.route("**/*", block_non_essential)
             page = await context.new_page()
             await Stealth().apply_stealth_async(page)
 
@@ -509,6 +548,7 @@ class P4NScraper:
             if self.is_dev:
                 ts_print(f"🛠️  [DEV MODE] Seeking {DEV_LIMIT} successful run(s)...")
 
+            last_scraped_by_id = self._last_scraped_index()
             tasks = []
             for link in discovered:
                 if self.is_dev and self.stats["read"] >= DEV_LIMIT:
@@ -516,14 +556,8 @@ class P4NScraper:
 
                 p_id = link.split("/")[-1]
                 is_stale = True
-                if (
-                    not self.force
-                    and not self.existing_df.empty
-                    and str(p_id) in self.existing_df["p4n_id"].astype(str).values
-                ):
-                    last_date = self.existing_df[
-                        self.existing_df["p4n_id"].astype(str) == str(p_id)
-                    ]["last_scraped"].iloc[0]
+                if not self.force and str(p_id) in last_scraped_by_id:
+                    last_date = last_scraped_by_id[str(p_id)]
                     if pd.notnull(last_date) and (
                         datetime.now() - pd.to_datetime(last_date)
                     ) < timedelta(days=STALENESS_DAYS):
@@ -582,70 +616,41 @@ class P4NScraper:
             if not self.is_dev and not self.single_url and not self.search_url:
                 DailyQueueManager.increment_state(self.batch_size)
 
+    @staticmethod
+    def _normalize_for_upsert(df):
+        df = df.copy()
+        if "p4n_id" in df.columns:
+            df["p4n_id"] = df["p4n_id"].astype(str).str.strip().replace("nan", "")
+        else:
+            df["p4n_id"] = ""
+
+        if "last_scraped" in df.columns:
+            df["last_scraped"] = pd.to_datetime(df["last_scraped"], errors="coerce")
+        else:
+            df["last_scraped"] = pd.NaT
+
+        return df[df["p4n_id"].astype(bool)]
+
     def _upsert_and_save(self):
         if not self.processed_batch:
             return
 
         try:
-            new_df = pd.DataFrame(self.processed_batch)
-
-            if "p4n_id" in new_df.columns:
-                new_df["p4n_id"] = (
-                    new_df["p4n_id"].astype(str).str.strip().replace("nan", "")
-                )
-            else:
-                new_df["p4n_id"] = ""
-
-            if "last_scraped" in new_df.columns:
-                new_df["last_scraped"] = pd.to_datetime(
-                    new_df["last_scraped"], errors="coerce"
-                )
-            else:
-                new_df["last_scraped"] = pd.NaT
-
-            new_df = new_df[new_df["p4n_id"].astype(bool)].copy()
-
-            existing = (
-                self.existing_df.copy()
-                if not self.existing_df.empty
-                else pd.DataFrame()
-            )
-
-            if not existing.empty:
-                if "p4n_id" in existing.columns:
-                    existing["p4n_id"] = (
-                        existing["p4n_id"].astype(str).str.strip().replace("nan", "")
-                    )
-                else:
-                    existing["p4n_id"] = ""
-
-                if "last_scraped" in existing.columns:
-                    existing["last_scraped"] = pd.to_datetime(
-                        existing["last_scraped"], errors="coerce"
-                    )
-                else:
-                    existing["last_scraped"] = pd.NaT
-
-                existing = existing[existing["p4n_id"].astype(bool)].copy()
-
-            if not new_df.empty:
-                new_df["_is_new"] = True
-            if not existing.empty:
-                existing["_is_new"] = False
-
-            final_df = pd.concat([new_df, existing], ignore_index=True, sort=False)
-
-            if "last_scraped" in final_df.columns:
-                final_df["last_scraped"] = pd.to_datetime(
-                    final_df["last_scraped"], errors="coerce"
-                )
-
-            if "p4n_id" in final_df.columns:
-                final_df = final_df.drop_duplicates(subset=["p4n_id"], keep="first")
-
-            if "_is_new" in final_df.columns:
-                final_df = final_df.drop(columns=["_is_new"])
-
+            # Rows live in a dict keyed by p4n_id, so an upsert only touches the batch
+            if self._rows is None:
+                self._rows = {}
+                if not self.existing_df.empty:
+                    existing = self._normalize_for_upsert(self.existing_df)
+                    for record in existing.to_dict("records"):
+                        self._rows.setdefault(record["p4n_id"], record)
+
+            new_df = self._normalize_for_upsert(pd.DataFrame(self.processed_batch))
+            batch_rows = {}
+            for record in new_df.to_dict("records"):
+                batch_rows.setdefault(record["p4n_id"], record)
+            self._rows.update(batch_rows)
+
+            final_df = pd.DataFrame.from_records(list(self._rows.values()))
             final_df.to_csv(self.csv_file, index=False)
 
         except Exception as e:
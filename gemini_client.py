@@ -0,0 +1,47 @@
+import asyncio
+import functools
+import random
+
+import httpx
+from google import genai
+from google.genai import errors, types
+
+# Concurrent batches multiplex over a few pooled HTTP/2 connections instead of one TLS handshake each
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+# Backoff for transient Gemini failures: 1s, 2s, 4s, ... capped at 30s, plus up to 1s jitter
+GEMINI_MAX_ATTEMPTS = 5
+BACKOFF_INITIAL = 1.0
+BACKOFF_MAX = 30.0
+
+
+@functools.lru_cache(maxsize=None)
+def get_client(api_key):
+    """Process-wide Gemini client for api_key, created on first use and shared by every caller."""
+    # Hand over a prebuilt httpx client: with aiohttp installed (firecrawl-py pulls it in),
+    # google-genai would switch to aiohttp and silently drop httpx-only args like http2/limits
+    http_options = types.HttpOptions(
+        httpx_async_client=httpx.AsyncClient(http2=True, limits=HTTP_LIMITS)
+    )
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def is_transient(e):
+    if isinstance(e, errors.ServerError):
+        return True
+    if isinstance(e, errors.ClientError):
+        return e.code == 429
+    return isinstance(e, (TimeoutError, httpx.TimeoutException, httpx.TransportError))
+
+
+async def generate_with_retry(client, **kwargs):
+    """generate_content with jittered exponential backoff on 5xx/429/timeouts; anything else raises at once."""
+    for attempt in range(GEMINI_MAX_ATTEMPTS):
+        try:
+            return await client.aio.models.generate_content(**kwargs)
+        except Exception as e:
+            if not is_transient(e) or attempt == GEMINI_MAX_ATTEMPTS - 1:
+                raise
+            delay = min(BACKOFF_MAX, BACKOFF_INITIAL * 2**attempt) + random.uniform(0, 1)
+            print(f"   ↻ Transient Gemini error ({e}); retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
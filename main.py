@@ -1,50 +1,59 @@
+import asyncio
 import os
 from firecrawl import FirecrawlApp
 
-def main():
+# Firecrawl calls are blocking, so keep this at or below the plan's concurrency limit
+MAX_CONCURRENT_SCRAPES = 5
+
+TARGET_URLS = [
+    "https://www.idealista.pt/imovel/33454228/",  # Example listing
+]
+
+SCRAPE_PARAMS = {
+    "formats": ["json"],
+    "jsonOptions": {
+        "schema": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string"},
+                "price": {"type": "string"},
+                "location": {"type": "string"},
+                "description": {"type": "string"},
+                "features": {"type": "array", "items": {"type": "string"}},
+                "energy_certificate": {"type": "string"}
+            },
+            "required": ["price", "location"]
+        }
+    },
+    "waitFor": 3000  # Gives Idealista time to load/bypass initial check
+}
+
+async def scrape_one(app, url, sem):
+    async with sem:
+        print(f"--- Starting scrape for: {url} ---")
+        return await asyncio.to_thread(app.scrape_url, url, params=SCRAPE_PARAMS)
+
+async def main():
     # 1. Initialize the App
     # Replace 'fc-YOUR_API_KEY' with your actual key or set it in your env variables
     api_key = os.getenv("FIRECRAWL_API_KEY", "fc-YOUR_API_KEY")
     app = FirecrawlApp(api_key=api_key)
 
-    # 2. Define the target URL
-    target_url = "https://www.idealista.pt/imovel/33454228/" # Example listing
-
-    print(f"--- Starting scrape for: {target_url} ---")
-
-    try:
-        # 3. Perform the scrape (Fixed Syntax)
-        scrape_result = app.scrape_url(
-            target_url, 
-            params={
-                "formats": ["json"],
-                "jsonOptions": {
-                    "schema": {
-                        "type": "object",
-                        "properties": {
-                            "title": {"type": "string"},
-                            "price": {"type": "string"},
-                            "location": {"type": "string"},
-                            "description": {"type": "string"},
-                            "features": {"type": "array", "items": {"type": "string"}},
-                            "energy_certificate": {"type": "string"}
-                        },
-                        "required": ["price", "location"]
-                    }
-                },
-                "waitFor": 3000  # Gives Idealista time to load/bypass initial check
-            }
-        )
-
-        # 4. Display the results
-        if scrape_result:
-            print("Successfully scraped data:")
+    # 2. Scrape all targets concurrently, bounded by the semaphore
+    sem = asyncio.Semaphore(MAX_CONCURRENT_SCRAPES)
+    results = await asyncio.gather(
+        *(scrape_one(app, url, sem) for url in TARGET_URLS), return_exceptions=True
+    )
+
+    # 3. Display the results
+    for url, scrape_result in zip(TARGET_URLS, results):
+        if isinstance(scrape_result, Exception):
+            print(f"An error occurred for {url}: {scrape_result}")
+        elif scrape_result:
+            print(f"Successfully scraped data for {url}:")
             print(scrape_result)
         else:
-            print("No data returned.")
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
+            print(f"No data returned for {url}.")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
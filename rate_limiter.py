@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+
+def estimate_tokens(*texts):
+    """Rough prompt size for throttling purposes (~4 characters per token)."""
+    return sum(len(t) for t in texts) // 4 + 1
+
+
+class RateLimiter:
+    """Token-bucket throttle for Gemini calls.
+
+    Request and token capacity refill continuously at limit/60 per second, and
+    acquire() waits until both buckets can cover the next call, so parallel
+    batches stay under RPM/TPM instead of bouncing off 429s.
+    """
+
+    def __init__(self, requests_per_minute=500, tokens_per_minute=1_000_000):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.available_request_capacity = float(requests_per_minute)
+        self.available_token_capacity = float(tokens_per_minute)
+        self.last_update_time = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_update_time
+        self.available_request_capacity = min(
+            self.requests_per_minute,
+            self.available_request_capacity + elapsed * self.requests_per_minute / 60,
+        )
+        self.available_token_capacity = min(
+            self.tokens_per_minute,
+            self.available_token_capacity + elapsed * self.tokens_per_minute / 60,
+        )
+        self.last_update_time = now
+
+    async def acquire(self, tokens):
+        # A single call larger than the whole bucket must still be admitted eventually
+        tokens = min(tokens, self.tokens_per_minute)
+        # Waiters queue on the lock, so capacity is handed out in arrival order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.available_request_capacity >= 1 and self.available_token_capacity >= tokens:
+                    self.available_request_capacity -= 1
+                    self.available_token_capacity -= tokens
+                    return
+                request_wait = (1 - self.available_request_capacity) * 60 / self.requests_per_minute
+                token_wait = (tokens - self.available_token_capacity) * 60 / self.tokens_per_minute
+                await asyncio.sleep(max(request_wait, token_wait, 0.01))
@@ -1,17 +1,36 @@
 import argparse
+import hashlib
 import json
 import os
 import asyncio
 import re
+import shelve
 import sys
-from typing import List, Dict, Set
-from google import genai
+from collections import defaultdict
+from itertools import chain, islice
+from typing import List, Dict, Set, Tuple
+
+import ijson
+import orjson
 from google.genai import types
 
+from gemini_client import generate_with_retry, get_client
+from rate_limiter import RateLimiter, estimate_tokens
+
 # --- CONFIGURATION ---
 API_KEY = os.environ.get("GOOGLE_API_KEY")
 EVAL_SET_FILE = "eval_set.json"
 PROMPT_FILE = "llm_prompt.txt"
+LLM_CACHE_FILE = ".llm_cache"  # shelve store of parsed responses, keyed by (model, prompt) hash
+
+JSON_FENCE_RE = re.compile(r"```(?:json)?\s*", re.IGNORECASE)
+
+# call_model's result when the request itself failed, as opposed to an answer we could not use
+API_FAILED = object()
+
+# Gemini quota to stay under when batches run in parallel
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 1_000_000
 
 # Model Options
 MODELS = {
@@ -19,15 +38,18 @@ MODELS = {
     "lite": "gemini-2.5-flash-lite"
 }
 
+rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
 def load_data(limit: int = 0):
     if not os.path.exists(EVAL_SET_FILE):
         print(f"❌ Critical: {EVAL_SET_FILE} not found.")
         sys.exit(1)
-    with open(EVAL_SET_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    if limit > 0:
-        return data[:limit]
-    return data
+    # Stream items so a small --limit stops reading after the first few entries
+    with open(EVAL_SET_FILE, "rb") as f:
+        items = ijson.items(f, "item", use_float=True)
+        if limit > 0:
+            return list(islice(items, limit))
+        return list(items)
 
 def load_prompt():
     if not os.path.exists(PROMPT_FILE):
@@ -48,63 +70,116 @@ def load_prompt():
                 content = content.replace("{con_taxonomy_block}", "\n".join(con_list))
         return content
 
-def calculate_metrics(gold_set: Set[str], pred_set: Set[str]):
+def calculate_metrics(gold_set: Set[Tuple[int, str]], pred_set: Set[Tuple[int, str]]):
     tp = len(gold_set.intersection(pred_set))
     fp_set = pred_set - gold_set
     fn_set = gold_set - pred_set
-    return len(gold_set.intersection(pred_set)), len(fp_set), len(fn_set), fp_set, fn_set
+    return tp, len(fp_set), len(fn_set), fp_set, fn_set
 
 def extract_json_content(text):
-    text = re.sub(r"```json\s*", "", text, flags=re.IGNORECASE)
-    text = re.sub(r"```\s*", "", text)
-    return text.strip()
+    # JSON mode usually returns bare JSON, so skip the regex when there is no fence at all
+    if "```" not in text:
+        return text.strip()
+    return JSON_FENCE_RE.sub("", text).strip()
 
-async def process_batch(client, model_name, system_instruction, batch_reviews, start_index):
+def cache_key(model_name, system_instruction, contents):
+    return hashlib.blake2b((model_name + system_instruction + contents).encode("utf-8")).hexdigest()
+
+def align_predictions(preds, expected):
+    """Maps the model's answer onto one dict per input review, using the `id` field when it is usable."""
+    aligned = [{} for _ in range(expected)]
+    ids = [p.get("id") if isinstance(p, dict) else None for p in preds]
+    if all(isinstance(i, int) and 0 <= i < expected for i in ids) and len(set(ids)) == len(ids):
+        for item_id, pred in zip(ids, preds):
+            aligned[item_id] = pred
+    else:
+        for i, pred in enumerate(preds[:expected]):
+            aligned[i] = pred if isinstance(pred, dict) else {}
+    if len(preds) != expected:
+        print(f"   ⚠️ Expected {expected} predictions, got {len(preds)}. Missing items scored as empty.")
+    return aligned
+
+async def process_batch(client, model_name, system_instruction, batch_reviews, start_index, cache=None, allow_split=True):
     config = types.GenerateContentConfig(
         response_mime_type="application/json",
         temperature=0.0,
         system_instruction=system_instruction,
     )
+    contents = f"ANALYZE REVIEWS:\n{orjson.dumps(batch_reviews).decode()}"
+
+    # temperature=0.0 makes the answer a function of (model, prompt), so repeats are safe to reuse.
+    key = cache_key(model_name, system_instruction, contents)
+    if cache is not None and key in cache:
+        return cache[key]
+
+    parsed = await call_model(client, model_name, config, contents, start_index)
+    # generate_with_retry already spent its attempts on API errors, so don't pile more calls on top
+    if parsed is API_FAILED:
+        return None
+
+    # Large batches are more likely to come back truncated or malformed; retry once as two halves.
+    # The halves run one after the other so the batch still holds a single concurrency slot.
+    if parsed is None and allow_split and len(batch_reviews) > 1:
+        mid = len(batch_reviews) // 2
+        print(f"   ↩️ Retrying batch {start_index} as two halves ({mid} + {len(batch_reviews) - mid} items)...")
+        first = await process_batch(client, model_name, system_instruction, batch_reviews[:mid], start_index, cache, allow_split=False)
+        if first is None:
+            return None
+        second = await process_batch(client, model_name, system_instruction, batch_reviews[mid:], start_index + mid, cache, allow_split=False)
+        if second is None:
+            return None
+        return first + second
+
+    if parsed is None:
+        return None
 
+    aligned = align_predictions(parsed, len(batch_reviews))
+    if cache is not None:
+        cache[key] = aligned
+    return aligned
+
+async def call_model(client, model_name, config, contents, start_index):
     try:
-        response = await client.aio.models.generate_content(
+        await rate_limiter.acquire(estimate_tokens(config.system_instruction, contents))
+        response = await generate_with_retry(
+            client,
             model=model_name,
-            contents=f"ANALYZE REVIEWS:\n{json.dumps(batch_reviews)}",
+            contents=contents,
             config=config,
         )
+    except Exception as e:
+        print(f"   ⚠️ API/Network Error in batch {start_index}: {str(e)}")
+        return API_FAILED
+
+    # A blocked or empty answer has no text; treat it like any other unparseable reply
+    raw_text = extract_json_content(response.text or "")
+
+    try:
+        parsed = orjson.loads(raw_text)
+    except json.JSONDecodeError:
+        print(f"   ⚠️ JSON Decode Error in batch {start_index}. Response preview: {raw_text[:100]}...")
+        return None 
+
+    if isinstance(parsed, list):
+        return parsed
+    
+    if isinstance(parsed, dict):
+        for key in ["reviews", "data", "results", "output", "items", "analysis"]:
+            if key in parsed and isinstance(parsed[key], list):
+                return parsed[key]
         
-        raw_text = extract_json_content(response.text)
-        
-        try:
-            parsed = json.loads(raw_text)
-        except json.JSONDecodeError:
-            print(f"   ⚠️ JSON Decode Error in batch {start_index}. Response preview: {raw_text[:100]}...")
-            return None 
-
-        if isinstance(parsed, list):
-            return parsed
-        
-        if isinstance(parsed, dict):
-            for key in ["reviews", "data", "results", "output", "items", "analysis"]:
-                if key in parsed and isinstance(parsed[key], list):
-                    return parsed[key]
-            
-            if len(parsed) == 1:
-                key = list(parsed.keys())[0]
-                if isinstance(parsed[key], list):
-                    return parsed[key]
-
-            print(f"   ⚠️ Parsed JSON is a dict but couldn't find the list. Keys: {list(parsed.keys())}")
-            return None
+        if len(parsed) == 1:
+            key = list(parsed.keys())[0]
+            if isinstance(parsed[key], list):
+                return parsed[key]
 
+        print(f"   ⚠️ Parsed JSON is a dict but couldn't find the list. Keys: {list(parsed.keys())}")
         return None
 
-    except Exception as e:
-        print(f"   ⚠️ API/Network Error in batch {start_index}: {str(e)}")
-        return None
+    return None
 
-async def run_evaluation(model_key: str, limit: int, batch_size: int):
-    client = genai.Client(api_key=API_KEY)
+async def run_evaluation(model_key: str, limit: int, batch_size: int, use_cache: bool = True, concurrency: int = 8):
+    client = get_client(API_KEY)
     model_name = MODELS.get(model_key, model_key)
     
     print(f"🚀 Loading Data...")
@@ -126,60 +201,71 @@ async def run_evaluation(model_key: str, limit: int, batch_size: int):
     else:
         print(f"   Mode: BATCHED (Batch size: {effective_batch_size})")
 
-    for i in range(0, total_items, effective_batch_size):
-        batch_gold = gold_data[i : i + effective_batch_size]
-        batch_reviews = [item["review"] for item in batch_gold]
-        
-        current_batch_num = (i // effective_batch_size) + 1
-        print(f"   Processing batch {current_batch_num} (Items {i} to {i+len(batch_reviews)})...")
-        
-        batch_preds = await process_batch(client, model_name, system_instruction, batch_reviews, i)
-        
-        if batch_preds is not None:
+    batches = [
+        (i, [item["review"] for item in gold_data[i : i + effective_batch_size]])
+        for i in range(0, total_items, effective_batch_size)
+    ]
+    sem = asyncio.Semaphore(max(1, concurrency))
+    print(f"   Dispatching {len(batches)} batches (Concurrency: {concurrency})")
+
+    async def bounded(batch_num, start_index, batch_reviews):
+        async with sem:
+            print(f"   Processing batch {batch_num} (Items {start_index} to {start_index+len(batch_reviews)})...")
+            return await process_batch(client, model_name, system_instruction, batch_reviews, start_index, cache)
+
+    cache = shelve.open(LLM_CACHE_FILE) if use_cache else None
+    try:
+        results = await asyncio.gather(
+            *(bounded(n, i, batch_reviews) for n, (i, batch_reviews) in enumerate(batches, start=1)),
+            return_exceptions=True,
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+
+    # gather preserves submission order, so predictions stay aligned with gold_data
+    for current_batch_num, ((i, batch_reviews), batch_preds) in enumerate(zip(batches, results), start=1):
+        if batch_preds is not None and not isinstance(batch_preds, BaseException):
             predictions.extend(batch_preds)
         else:
             print(f"   ❌ Batch {current_batch_num} FAILED.")
-            errors_occurred = True 
+            errors_occurred = True
             predictions.extend([{} for _ in batch_reviews])
 
     # --- SCORING & DIFF LOGGING ---
     print("\n📊 Calculating Metrics & Diffing...")
     
-    total_tp, total_fp, total_fn = 0, 0, 0
-    diff_log = []
+    # Score every (item, tag) pair in one set operation instead of building sets per item
+    gold_pairs = {
+        (i, tag)
+        for i, gold_item in enumerate(gold_data)
+        for tag in chain(gold_item.get("pros", []), gold_item.get("cons", []))
+    }
+    pred_pairs = {
+        (i, tag)
+        for i, pred_item in enumerate(predictions[:total_items])
+        if isinstance(pred_item, dict)
+        for tag in chain(pred_item.get("pros", []), pred_item.get("cons", []))
+    }
+    total_tp, total_fp, total_fn, fp_pairs, fn_pairs = calculate_metrics(gold_pairs, pred_pairs)
 
-    for i, gold_item in enumerate(gold_data):
-        gold_pros = set(gold_item.get("pros", []))
-        gold_cons = set(gold_item.get("cons", []))
-        
-        if i < len(predictions):
-            pred_item = predictions[i]
-            if isinstance(pred_item, dict):
-                pred_pros = set(pred_item.get("pros", []))
-                pred_cons = set(pred_item.get("cons", []))
-            else:
-                pred_pros, pred_cons = set(), set()
-        else:
-            pred_pros, pred_cons = set(), set()
-
-        gold_all = gold_pros.union(gold_cons)
-        pred_all = pred_pros.union(pred_cons)
-
-        tp, fp, fn, fp_set, fn_set = calculate_metrics(gold_all, pred_all)
-        total_tp += tp
-        total_fp += fp
-        total_fn += fn
-
-        # Log diffs if there are errors
-        if fp > 0 or fn > 0:
-            review_snippet = gold_item.get('review', '')[:80].replace("\n", " ") + "..."
-            diff_entry = {
-                "id": i,
-                "review": review_snippet,
-                "hallucinations (+)": list(fp_set),
-                "missed (-)": list(fn_set)
-            }
-            diff_log.append(diff_entry)
+    fp_by_item, fn_by_item = defaultdict(list), defaultdict(list)
+    for i, tag in fp_pairs:
+        fp_by_item[i].append(tag)
+    for i, tag in fn_pairs:
+        fn_by_item[i].append(tag)
+
+    # Log diffs for items with errors
+    diff_log = []
+    for i in sorted(fp_by_item.keys() | fn_by_item.keys()):
+        review_snippet = gold_data[i].get('review', '')[:80].replace("\n", " ") + "..."
+        diff_entry = {
+            "id": i,
+            "review": review_snippet,
+            "hallucinations (+)": fp_by_item[i],
+            "missed (-)": fn_by_item[i]
+        }
+        diff_log.append(diff_entry)
 
     precision = total_tp / (total_tp + total_fp) if (total_tp + total_fp) > 0 else 0
     recall = total_tp / (total_tp + total_fn) if (total_tp + total_fn) > 0 else 0
@@ -216,8 +302,10 @@ async def run_evaluation(model_key: str, limit: int, batch_size: int):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--limit", type=int, default=10, help="Number of reviews to evaluate (0 for all)")
-    parser.add_argument("--batch_size", type=int, default=10, help="Items per API call (0 for single call)")
+    parser.add_argument("--batch_size", type=int, default=30, help="Items per API call (0 for single call)")
     parser.add_argument("--model", type=str, choices=["flash", "lite"], default="lite")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max batches in flight at once")
+    parser.add_argument("--no_cache", action="store_true", help=f"Bypass the {LLM_CACHE_FILE} response cache")
     args = parser.parse_args()
     
-    asyncio.run(run_evaluation(args.model, args.limit, args.batch_size))
+    asyncio.run(run_evaluation(args.model, args.limit, args.batch_size, use_cache=not args.no_cache, concurrency=args.concurrency))
@@ -1,42 +1,67 @@
+import argparse
 import asyncio
+import functools
+import hashlib
 import json
 import os
 import re
+import shelve
+import orjson
 import pandas as pd
 from datetime import datetime
-from google import genai
 from google.genai import types
 from playwright.async_api import async_playwright
 from playwright_stealth import Stealth
 
+from gemini_client import generate_with_retry, get_client
+from rate_limiter import RateLimiter, estimate_tokens
+
 # --- CONFIG ---
 DISCOVERY_MODEL = "gemini-2.5-flash"
 URL_LIST_FILE = "url_list.txt"
 TAXONOMY_FILE = "taxonomy.json"  # New source of truth
 OUTPUT_FILE = "taxonomy_discovery_report.json"
+LLM_CACHE_FILE = ".llm_cache"  # shelve store of parsed responses, keyed by (model, prompt) hash
+PROFILE_DIR = ".pw_profile"  # Persistent Chromium profile, keeps caches warm between runs
 BATCH_SIZE = 5 
+SCRAPE_CONCURRENCY = 5  # Size of the reusable page pool, i.e. max property pages loading at once
+
+# Only review text is needed, so skip heavy assets and trackers.
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+BLOCKED_DOMAINS = ("googletagmanager", "doubleclick", "facebook.net", "hotjar", "sentry")
+
+# Gemini quota to stay under when batches run in parallel
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 1_000_000
 
 GEMINI_API_KEY = os.environ.get("GOOGLE_API_KEY")
-client = genai.Client(api_key=GEMINI_API_KEY)
+client = get_client(GEMINI_API_KEY)
+rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
 
 def ts_print(msg):
     print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
 
+async def block_non_essential(route):
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(d in request.url for d in BLOCKED_DOMAINS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+@functools.lru_cache(maxsize=1)
 def load_current_taxonomy():
-    """Reads the current taxonomy from the JSON file and formats it with descriptions for the AI."""
+    """Reads the current taxonomy from the JSON file and formats it with descriptions for the AI.
+    Cached, since the file does not change during a run and every batch needs it."""
     if os.path.exists(TAXONOMY_FILE):
         try:
             with open(TAXONOMY_FILE, "r", encoding="utf-8") as f:
                 data = json.load(f)
                 
                 # Format each entry as "topic: description"
-                pro_lines = [f"- {item['topic']}: {item['description']}" 
-                             for item in data.get("pros", []) if isinstance(item, dict)]
-                con_lines = [f"- {item['topic']}: {item['description']}" 
-                             for item in data.get("cons", []) if isinstance(item, dict)]
-                
-                pro_block = "\n".join(pro_lines)
-                con_block = "\n".join(con_lines)
+                pro_block = "\n".join(f"- {item['topic']}: {item['description']}" 
+                                      for item in data.get("pros", []) if isinstance(item, dict))
+                con_block = "\n".join(f"- {item['topic']}: {item['description']}" 
+                                      for item in data.get("cons", []) if isinstance(item, dict))
                 
                 return f"### PRO_KEYS (Topic: Definition) ###\n{pro_block}\n\n### CON_KEYS (Topic: Definition) ###\n{con_block}"
         except Exception as e:
@@ -45,12 +70,16 @@ def load_current_taxonomy():
     return "No current taxonomy found."
 
 class TaxonomyDiscoverer:
-    def __init__(self):
+    def __init__(self, use_cache=True):
         self.suggested_keys = []
+        self.use_cache = use_cache
+        self.cache = None
+        self.page_pool = None
 
-    async def scrape_url(self, context, url):
+    async def scrape_url(self, url):
+        # Waiting on the pool also caps concurrency at SCRAPE_CONCURRENCY pages
+        page = await self.page_pool.get()
         ts_print(f"🌐 Scraping Property: {url}")
-        page = await context.new_page()
         reviews = []
         try:
             await page.goto(url, wait_until="domcontentloaded", timeout=30000)
@@ -63,9 +92,14 @@ class TaxonomyDiscoverer:
         except Exception as e:
             ts_print(f"⚠️ Could not find reviews on {url}")
         finally:
-            await page.close()
+            self.page_pool.put_nowait(page)
         return {"url": url, "reviews": reviews}
 
+    async def discover_batch(self, batch_urls):
+        """Scrapes one batch and analyzes it as soon as its pages are in, while other batches are still loading."""
+        batch_results = await asyncio.gather(*[self.scrape_url(u) for u in batch_urls])
+        return await self.analyze_batch(batch_results)
+
     async def analyze_batch(self, batch_data):
         valid_data = [d for d in batch_data if d['reviews']]
         if not valid_data:
@@ -100,18 +134,29 @@ class TaxonomyDiscoverer:
             system_instruction=system_instruction,
         )
 
-        response = await client.aio.models.generate_content(
+        contents = f"NEW DATA TO ANALYZE:\n{orjson.dumps(valid_data).decode()}"
+        key = hashlib.blake2b((DISCOVERY_MODEL + system_instruction + contents).encode("utf-8")).hexdigest()
+        if self.cache is not None and key in self.cache:
+            return self.cache[key]
+
+        await rate_limiter.acquire(estimate_tokens(system_instruction, contents))
+        response = await generate_with_retry(
+            client,
             model=DISCOVERY_MODEL,
-            contents=f"NEW DATA TO ANALYZE:\n{json.dumps(valid_data)}",
+            contents=contents,
             config=config,
         )
         
         try:
-            return json.loads(response.text)
+            analysis = orjson.loads(response.text)
         except:
             ts_print("❌ Failed to parse AI JSON")
             return {"new_suggestions": []}
 
+        if self.cache is not None:
+            self.cache[key] = analysis
+        return analysis
+
     async def run(self):
         if not os.path.exists(URL_LIST_FILE):
             ts_print(f"❌ ERROR: {URL_LIST_FILE} not found.")
@@ -121,8 +166,10 @@ class TaxonomyDiscoverer:
             search_urls = [line.strip() for line in f if line.strip()][:3]
 
         async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context()
+            context = await p.chromium.launch_persistent_context(
+                user_data_dir=PROFILE_DIR, headless=True
+            )
+            await context.route("**/*", block_non_essential)
             await Stealth().apply_stealth_async(context)
             
             discovery_links = []
@@ -155,21 +202,43 @@ class TaxonomyDiscoverer:
 
             if not discovered:
                 ts_print("❌ Still found 0 properties. Please check if search pages are active.")
-                await browser.close()
+                await context.close()
                 return
 
             ts_print(f"✅ Found {len(discovered)} properties. Limiting to first 50 for taxonomy audit.")
             target_sample = discovered[:50]
 
-            for i in range(0, len(target_sample), BATCH_SIZE):
-                batch_urls = target_sample[i:i + BATCH_SIZE]
-                scrape_tasks = [self.scrape_url(context, u) for u in batch_urls]
-                batch_results = await asyncio.gather(*scrape_tasks)
-                
-                analysis = await self.analyze_batch(batch_results)
+            # Read the taxonomy file off the event loop once; every analyze_batch then hits the cache
+            await asyncio.to_thread(load_current_taxonomy)
+
+            # Pre-create the pages once and hand them out per URL instead of opening one per scrape
+            pages = [await context.new_page() for _ in range(SCRAPE_CONCURRENCY)]
+            self.page_pool = asyncio.Queue()
+            for pooled_page in pages:
+                self.page_pool.put_nowait(pooled_page)
+
+            batch_tasks = [
+                self.discover_batch(target_sample[i:i + BATCH_SIZE])
+                for i in range(0, len(target_sample), BATCH_SIZE)
+            ]
+            self.cache = shelve.open(LLM_CACHE_FILE) if self.use_cache else None
+            try:
+                analyses = await asyncio.gather(*batch_tasks, return_exceptions=True)
+            finally:
+                if self.cache is not None:
+                    self.cache.close()
+                    self.cache = None
+                for pooled_page in pages:
+                    await pooled_page.close()
+                self.page_pool = None
+
+            for analysis in analyses:
+                if isinstance(analysis, Exception):
+                    ts_print(f"❌ Batch analysis failed: {analysis}")
+                    continue
                 self.suggested_keys.extend(analysis.get("new_suggestions", []))
 
-            await browser.close()
+            await context.close()
 
         with open(OUTPUT_FILE, "w") as f:
             json.dump({
@@ -181,4 +250,8 @@ class TaxonomyDiscoverer:
         ts_print(f"✅ Discovery complete. Results in {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    asyncio.run(TaxonomyDiscoverer().run())
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no_cache", action="store_true", help=f"Bypass the {LLM_CACHE_FILE} response cache")
+    args = parser.parse_args()
+
+    asyncio.run(TaxonomyDiscoverer(use_cache=not args.no_cache).run())
@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+
+class FakeClock:
+    """Stands in for time.monotonic/asyncio.sleep: sleeping records the delay and advances now."""
+
+    def __init__(self, start=1000.0):
+        self.now = start
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(asyncio, "sleep", clock.sleep)
+    return clock
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import httpx
+import pytest
+from google.genai import errors
+
+from gemini_client import GEMINI_MAX_ATTEMPTS, HTTP_LIMITS, generate_with_retry, get_client
+
+
+def make_client(outcomes):
+    """Stub client whose generate_content raises or returns each outcome in turn."""
+    calls = []
+
+    async def generate_content(**kwargs):
+        calls.append(kwargs)
+        outcome = outcomes[len(calls) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    return client, calls
+
+
+@pytest.mark.parametrize(
+    "error",
+    [errors.ServerError(503, {}), errors.ClientError(429, {})],
+)
+def test_transient_error_is_retried(fake_clock, error):
+    client, calls = make_client([error, "ok"])
+
+    result = asyncio.run(generate_with_retry(client, model="m", contents="c"))
+
+    assert result == "ok"
+    assert len(calls) == 2
+    assert len(fake_clock.sleeps) == 1
+
+
+def test_client_error_raises_immediately(fake_clock):
+    client, calls = make_client([errors.ClientError(400, {})])
+
+    with pytest.raises(errors.ClientError):
+        asyncio.run(generate_with_retry(client, model="m", contents="c"))
+
+    assert len(calls) == 1
+    assert fake_clock.sleeps == []
+
+
+def test_gives_up_after_max_attempts(fake_clock):
+    client, calls = make_client([errors.ServerError(503, {})] * GEMINI_MAX_ATTEMPTS)
+
+    with pytest.raises(errors.ServerError):
+        asyncio.run(generate_with_retry(client, model="m", contents="c"))
+
+    assert len(calls) == GEMINI_MAX_ATTEMPTS
+    assert len(fake_clock.sleeps) == GEMINI_MAX_ATTEMPTS - 1
+
+
+def test_rate_limit_response_from_api_is_retried(fake_clock):
+    # Build the ClientError the library itself raises for a real 429 quota response
+    response = httpx.Response(
+        429,
+        json={
+            "error": {
+                "code": 429,
+                "message": "Resource has been exhausted (e.g. check quota).",
+                "status": "RESOURCE_EXHAUSTED",
+            }
+        },
+        request=httpx.Request("POST", "https://generativelanguage.googleapis.com"),
+    )
+    with pytest.raises(errors.ClientError) as excinfo:
+        errors.APIError.raise_for_response(response)
+    client, calls = make_client([excinfo.value, "ok"])
+
+    result = asyncio.run(generate_with_retry(client, model="m", contents="c"))
+
+    assert result == "ok"
+    assert len(calls) == 2
+    assert len(fake_clock.sleeps) == 1
+
+
+def test_client_uses_pooled_http2_httpx_transport():
+    client = get_client("test-http2")
+    api_client = client._api_client
+
+    # A prebuilt httpx client keeps google-genai off aiohttp even when aiohttp is installed
+    assert not api_client._use_aiohttp()
+    async_client = api_client._async_httpx_client
+    assert isinstance(async_client, httpx.AsyncClient)
+    assert isinstance(async_client._transport, httpx.AsyncHTTPTransport)
+    assert async_client._transport._pool._http2
+    assert async_client._transport._pool._max_connections == HTTP_LIMITS.max_connections
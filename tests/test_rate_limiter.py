@@ -0,0 +1,58 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def clock(fake_clock, monkeypatch):
+    # Swap the module's time reference rather than time.monotonic itself, which the event loop also reads
+    monkeypatch.setattr(rate_limiter, "time", fake_clock)
+    return fake_clock
+
+
+def test_full_bucket_admits_immediately(clock):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+
+    asyncio.run(limiter.acquire(100))
+
+    assert clock.sleeps == []
+    assert limiter.available_request_capacity == 59
+    assert limiter.available_token_capacity == 5900
+
+
+def test_empty_request_bucket_waits_for_refill(clock):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+    limiter.available_request_capacity = 0.0
+
+    asyncio.run(limiter.acquire(10))
+
+    # deficit of 1 request at 60 RPM -> 1 * 60 / 60 = 1s
+    assert clock.sleeps == [pytest.approx(1.0)]
+    assert limiter.available_request_capacity == pytest.approx(0.0)
+
+
+def test_empty_token_bucket_waits_for_refill(clock):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+    limiter.available_token_capacity = 0.0
+
+    asyncio.run(limiter.acquire(300))
+
+    # deficit of 300 tokens at 6000 TPM -> 300 * 60 / 6000 = 3s
+    assert clock.sleeps == [pytest.approx(3.0)]
+    assert limiter.available_token_capacity == pytest.approx(0.0)
+
+
+def test_oversize_request_is_clamped_and_admitted(clock):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+
+    asyncio.run(limiter.acquire(50_000))
+
+    assert clock.sleeps == []
+    assert limiter.available_token_capacity == pytest.approx(0.0)
@@ -7,7 +7,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 import pandas as pd
 import pytest
 
-from backbone_crawler import P4NScraper
+from backbone_crawler import P4NScraper, PipelineLogger
 
 
 def make_row(pid, ts, title=None):
@@ -41,29 +41,38 @@ def test_upsert_and_save_normal(tmp_path):
     assert "100" in ids and "200" in ids
 
 
-def test_upsert_fallback_on_concat_error(tmp_path, monkeypatch):
+def test_upsert_fallback_on_save_error(tmp_path, monkeypatch):
     out = tmp_path / "out2.csv"
 
-    # start without existing CSV
+    # existing CSV with one row, so the fallback has to append rather than create
+    existing = pd.DataFrame([make_row(100, "2026-01-01 00:00:00")])
+    existing.to_csv(out, index=False)
+
     scraper = P4NScraper(is_dev=True)
     scraper.csv_file = str(out)
-    scraper.existing_df = pd.DataFrame()
+    scraper.existing_df = pd.read_csv(scraper.csv_file)
 
     scraper.processed_batch = [make_row(300, "2026-01-22 01:00:00")]
 
-    # force pd.concat to raise so main path fails and fallback append is used
-    def fake_concat(*args, **kwargs):
-        raise RuntimeError("forced concat error")
+    # force building the upserted frame to raise so the fallback append is used
+    def fake_from_records(*args, **kwargs):
+        raise RuntimeError("forced save error")
 
-    monkeypatch.setattr(pd, "concat", fake_concat)
+    monkeypatch.setattr(pd.DataFrame, "from_records", fake_from_records)
+
+    events = []
+    monkeypatch.setattr(
+        PipelineLogger, "log_event", staticmethod(lambda t, d: events.append((t, d)))
+    )
 
     # call save; should not raise
     scraper._upsert_and_save()
 
-    # fallback should have created the file with our row
-    assert out.exists()
+    assert events == [("UPSERT_SAVE_ERROR", {"error": "forced save error"})]
+
+    # fallback should have appended our row after the existing one
     df = pd.read_csv(out)
-    assert "300" in df["p4n_id"].astype(str).tolist()
+    assert df["p4n_id"].astype(str).tolist() == ["100", "300"]
 
 
 def test_dedupe_prioritizes_new(tmp_path):
@@ -1,12 +1,112 @@
+import hashlib
 import json
 import os
+import re
 
 import folium
 import numpy as np
+import orjson
 import pandas as pd
+from folium.plugins import MarkerCluster
 
 # Use environment variables to support both prod and dev modes
 
+# Only the columns the map reads; the rest of the backbone CSV is never loaded
+MAP_COLUMNS = [
+    "p4n_id",
+    "title",
+    "url",
+    "latitude",
+    "longitude",
+    "location_type",
+    "num_places",
+    "total_reviews",
+    "avg_rating",
+    "parking_min_eur",
+    "parking_max_eur",
+    "electricity_eur",
+    "review_seasonality",
+    "ai_pros",
+    "ai_cons",
+]
+
+# Popup placeholders for missing text, filled in once for the whole frame
+TEXT_DEFAULTS = {
+    "title": "N/A",
+    "url": "N/A",
+    "ai_pros": "None listed",
+    "ai_cons": "None listed",
+}
+
+# "tag (count); tag (count)" entries in the ai_pros / ai_cons columns
+TAG_RE = re.compile(r"(.+)\s\((\d+)\)")
+
+# Popup markup, built in the browser from a POPUPS record only when a marker is opened.
+# Text fields are html-escaped there so scraped titles/tags cannot inject HTML.
+# Styling lives in the page's .pp-* CSS rules.
+POPUP_JS = """const HTML_ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'};
+    const esc = s => String(s).replace(/[&<>"']/g, c => HTML_ESCAPES[c]);
+
+    // p = [hot, score, title, type, places, rating, reviews, parking, elec, stable, pros, cons, url]
+    function buildPopup(p) {
+        return `<div class="pp">
+            <div class="${p[0] ? 'pp-score pp-hot' : 'pp-score'}">Score: ${p[1]}</div>
+            <h3>${esc(p[2])}</h3>
+            <div class="pp-type">${esc(p[3])}</div>
+            <b>FIRE Stats:</b> ${p[4]} places | <b>Rating:</b> ${p[5]}⭐ (${p[6]} revs)<br>
+            <b>Costs:</b> ${p[7]} | <b>Elec:</b> ${p[8]}<br>
+            <b>Winter Stability:</b> ${p[9] ? '✅ STABLE' : '❌ SEASONAL'}<br>
+            <div class="pp-pros">
+                <b>Growth Moats:</b><br><span>${esc(p[10])}</span>
+            </div>
+            <div class="pp-cons">
+                <b>Yield Risks:</b><br><span>${esc(p[11])}</span>
+            </div>
+            <br><a href="${esc(p[12])}" target="_blank">View Data Source</a>
+        </div>`;
+    }"""
+
+# Marker colour and icon per score tier: >= 85, >= 60, everything else
+TIER_STYLES = [("cadetblue", "star"), ("green", "thumbs-up"), ("orange", "home")]
+
+# Builds one marker from a [lat, lng, tier, extraData] MARKER_ROWS entry.
+# Its index addresses POPUPS, the FILT_* arrays and markerStore alike.
+MARKER_JS = """// One icon per score tier, shared by every marker in that tier
+    const TIER_ICONS = TIER_STYLES.map(([color, icon]) => L.AwesomeMarkers.icon({extraClasses: 'fa-rotate-0', icon: icon, iconColor: 'white', markerColor: color, prefix: 'fa'}));
+
+    function makeMarker(row, i) {
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: TIER_ICONS[row[2]]});
+        marker.options.extraData = row[3];
+        // No popup object until the first click; then bind the built markup and open it
+        marker.once('click', () => marker.bindPopup(buildPopup(POPUPS[i]), {maxWidth: 350}).openPopup());
+        markerStore[i] = marker;
+        return marker;
+    }"""
+
+
+def raw_element(markup):
+    """Element whose markup is emitted verbatim instead of being compiled as a Jinja template."""
+    el = folium.Element("{{ this.markup }}")
+    el.markup = markup
+    return el
+
+
+def to_js(obj):
+    """Compact JSON for the page's data block; sorted keys keep equal-count tags in a stable order."""
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+def input_fingerprint(*paths):
+    """mtime/size stamp of the files a page is built from; unchanged stamp means the page is current."""
+    parts = []
+    for path in paths:
+        if os.path.exists(path):
+            st = os.stat(path)
+            parts.append(f"{path}:{st.st_mtime_ns}:{st.st_size}")
+        else:
+            parts.append(f"{path}:missing")
+    return hashlib.md5("|".join(parts).encode()).hexdigest()
+
 
 def generate_map(output_file="index.html"):
     # Use environment variables to support both prod and dev modes
@@ -17,6 +117,15 @@ def generate_map(output_file="index.html"):
         print(f"❌ {CSV_FILE} not found.")
         return
 
+    # Skip the rebuild when neither the inputs nor this script changed since the last run
+    meta_file = output_file + ".meta"
+    fingerprint = input_fingerprint(CSV_FILE, STRATEGIC_FILE, __file__)
+    if os.path.exists(output_file) and os.path.exists(meta_file):
+        with open(meta_file) as f:
+            if f.read().strip() == fingerprint:
+                print(f"⏭️ {output_file} is up to date, skipping.")
+                return
+
     # 1. Load Strategic Intelligence (Universal Score Map)
     score_map = {}
     recommendation = None
@@ -30,22 +139,33 @@ def generate_map(output_file="index.html"):
             print(f"⚠️ Could not load strategy JSON: {e}")
 
     # 2. Load and clean data
-    df = pd.read_csv(CSV_FILE)
+    # p4n_id stays text so it matches score_map keys as-is; types repeat, so keep them categorical
+    df = pd.read_csv(
+        CSV_FILE,
+        usecols=MAP_COLUMNS,
+        dtype={"p4n_id": "string", "location_type": "category"},
+    )
 
-    # Defensive cleaning
-    df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce").fillna(0)
-    df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce").fillna(0)
+    # Defensive cleaning; float32 still resolves coordinates to ~1m
+    df["latitude"] = (
+        pd.to_numeric(df["latitude"], errors="coerce").fillna(0).astype("float32")
+    )
+    df["longitude"] = (
+        pd.to_numeric(df["longitude"], errors="coerce").fillna(0).astype("float32")
+    )
     df["avg_rating"] = pd.to_numeric(df["avg_rating"], errors="coerce").fillna(0)
     df["num_places"] = (
-        pd.to_numeric(df["num_places"], errors="coerce").fillna(0).astype(int)
+        pd.to_numeric(df["num_places"], errors="coerce").fillna(0).astype("int32")
     )
     df["total_reviews"] = (
-        pd.to_numeric(df["total_reviews"], errors="coerce").fillna(0).astype(int)
+        pd.to_numeric(df["total_reviews"], errors="coerce").fillna(0).astype("int32")
     )
 
-    df_clean = df[(df["latitude"] != 0) & (df["longitude"] != 0)].dropna(
-        subset=["latitude", "longitude"]
-    )
+    # Coordinates were coerced with fillna(0) above, so one mask over the raw arrays
+    # drops both missing and zero points
+    lat_arr = df["latitude"].to_numpy()
+    lng_arr = df["longitude"].to_numpy()
+    df_clean = df[(lat_arr != 0) & (lng_arr != 0)].fillna(TEXT_DEFAULTS)
 
     if df_clean.empty:
         print("⚠️ No valid data found.")
@@ -72,101 +192,164 @@ def generate_map(output_file="index.html"):
         )
     )
 
-    marker_layer = folium.FeatureGroup(name="MainPropertyLayer")
-    marker_layer.add_to(m)
-    layer_name = marker_layer.get_name()  # Capture internal ID for JS
-
-    prop_types = sorted(df_clean["location_type"].unique().tolist())
-
-    for _, row in df_clean.iterrows():
-
-        def clean_int(val):
+    # Types as (sorted) category codes: the dropdown lists the names, the JS filter compares codes
+    type_col = df_clean["location_type"].cat.remove_unused_categories().cat
+    prop_types = type_col.categories.tolist()
+
+    # Score-driven styling resolved for the whole frame at once
+    # (raw scores are kept for display so ints stay ints; thresholds run on one float array)
+    opp_scores = [score_map.get(k, 0) for k in df_clean["p4n_id"].tolist()]
+    score_vals = np.asarray(opp_scores, dtype=np.float64)
+    tiers = [score_vals >= 85, score_vals >= 60]
+    tier_idx = np.select(tiers, [0, 1], 2)
+
+    def parse_tags(val):
+        tags = {}
+        for item in val.split(";"):
+            m = TAG_RE.search(item)
+            if m:
+                tags[m.group(1).strip()] = int(m.group(2))
+        return tags
+
+    def cost_labels(col):
+        # "N/A" for blanks/garbage, "Free" for 0, otherwise "<float>€", for the whole column at once
+        nums = pd.to_numeric(df_clean[col], errors="coerce").astype("float64")
+        labels = nums.astype(str) + "€"
+        return labels.mask(nums == 0, "Free").mask(nums.isna(), "N/A")
+
+    p_mins = cost_labels("parking_min_eur")
+    p_maxs = cost_labels("parking_max_eur")
+    parking_displays = p_mins.where(p_mins == p_maxs, p_mins + " - " + p_maxs).tolist()
+    elec_displays = cost_labels("electricity_eur").tolist()
+
+    def popup_text(col):
+        return df_clean[col].astype(str).tolist()
+
+    # Pull every consumed column out once as plain Python scalars and zip over them
+    lats = np.round(df_clean["latitude"].to_numpy(np.float64), 5).tolist()
+    lngs = np.round(df_clean["longitude"].to_numpy(np.float64), 5).tolist()
+    titles = popup_text("title")
+    urls = popup_text("url")
+    # Categorical, so no text placeholder in the frame; blanks keep code -1 for the filter
+    location_types = df_clean["location_type"].astype(object).fillna("N/A").astype(str).tolist()
+    places_col = df_clean["num_places"].tolist()
+    reviews_col = df_clean["total_reviews"].tolist()
+    ratings = popup_text("avg_rating")
+    score_texts = [str(score) for score in opp_scores]
+    seasonalities = df_clean["review_seasonality"].tolist()
+    has_seasons = df_clean["review_seasonality"].notna().tolist()
+    pros_col = popup_text("ai_pros")
+    cons_col = popup_text("ai_cons")
+
+    marker_rows = []
+    popups = []
+    for (
+        lat,
+        lng,
+        title,
+        url,
+        location_type,
+        num_places,
+        total_reviews,
+        avg_rating,
+        parking_display,
+        elec,
+        seasonality,
+        has_season,
+        ai_pros,
+        ai_cons,
+        score_text,
+        tier,
+        hot,
+    ) in zip(
+        lats,
+        lngs,
+        titles,
+        urls,
+        location_types,
+        places_col,
+        reviews_col,
+        ratings,
+        parking_displays,
+        elec_displays,
+        seasonalities,
+        has_seasons,
+        pros_col,
+        cons_col,
+        score_texts,
+        tier_idx.tolist(),
+        tiers[0].tolist(),
+    ):
+        stable = False
+        monthly = [0] * 12
+        if has_season:
             try:
-                if pd.isna(val) or val == "":
-                    return 0
-                return int(float(val))
-            except:
-                return 0
-
-        def format_cost(val):
-            if pd.isna(val) or val == "":
-                return "N/A"
-            try:
-                num = float(val)
-                return "Free" if num == 0 else f"{num}€"
-            except:
-                return "N/A"
-
-        num_places = clean_int(row.get("num_places", 0))
-        p_min = format_cost(row.get("parking_min_eur"))
-        p_max = format_cost(row.get("parking_max_eur"))
-        elec = format_cost(row.get("electricity_eur"))
-        parking_display = f"{p_min} - {p_max}" if p_min != p_max else p_min
-
-        seasonality_text = "No data"
-        stability_ratio = 0.0
-        try:
-            if pd.notna(row.get("review_seasonality")):
-                s_dict = json.loads(row["review_seasonality"])
-                sorted_keys = sorted(s_dict.keys())
-                seasonality_text = ", ".join(
-                    [f"{k}: {s_dict[k]}" for k in sorted_keys[-2:]]
-                )
-                winter_count = sum(
-                    v
-                    for k, v in s_dict.items()
-                    if any(m in k for m in ["-11", "-12", "-01", "-02"])
-                )
-                stability_ratio = 1.0 if winter_count > 0 else 0.0
-        except:
-            pass
-
-        opp_score = score_map.get(str(row["p4n_id"]), 0)
-
-        if opp_score >= 85:
-            marker_color, icon_type = "cadetblue", "star"
-        elif opp_score >= 60:
-            marker_color, icon_type = "green", "thumbs-up"
-        else:
-            marker_color, icon_type = "orange", "home"
-
-        popup_html = f"""<div style="font-family: Arial; width: 320px; font-size: 13px;">
-            <div style="float: right; background: {'#f1c40f' if opp_score >= 85 else '#eee'}; padding: 4px; border-radius: 4px; font-weight: bold;">Score: {opp_score}</div>
-            <h3 style="margin: 0;">{row['title']}</h3>
-            <div style="color: #666; font-style: italic; margin-bottom: 10px;">{row['location_type']}</div>
-            <b>FIRE Stats:</b> {num_places} places | <b>Rating:</b> {row['avg_rating']}⭐ ({row['total_reviews']} revs)<br>
-            <b>Costs:</b> {parking_display} | <b>Elec:</b> {elec}<br>
-            <b>Winter Stability:</b> {'✅ STABLE' if stability_ratio > 0 else '❌ SEASONAL'}<br>
-            <div style="margin-top: 10px; border-top: 1px solid #eee; padding-top: 10px;">
-                <b style="color: green;">Growth Moats:</b><br><span style="font-size: 11px;">{row.get('ai_pros', 'None listed')}</span>
-            </div>
-            <div style="margin-top: 5px;">
-                <b style="color: #d35400;">Yield Risks:</b><br><span style="font-size: 11px;">{row.get('ai_cons', 'None listed')}</span>
-            </div>
-            <br><a href="{row['url']}" target="_blank" style="display: block; text-align: center; background: #2c3e50; color: white; padding: 8px; border-radius: 4px; text-decoration: none; font-weight: bold;">View Data Source</a>
-        </div>"""
+                # Reviews per calendar month ("YYYY-MM" keys), summed by the dashboard chart
+                bins = [0] * 12
+                for k, v in orjson.loads(seasonality).items():
+                    bins[int(k[5:7]) - 1] += v
+                # Any Nov-Feb reviews mark the site as open through winter
+                stable = bins[10] + bins[11] + bins[0] + bins[1] > 0
+                monthly = bins
+            except (ValueError, TypeError, AttributeError, IndexError):
+                pass
+
+        # Display strings keep Python's number formatting (e.g. "4.0"); the page escapes text fields
+        popups.append(
+            [
+                int(hot),
+                score_text,
+                title,
+                location_type,
+                num_places,
+                avg_rating,
+                total_reviews,
+                parking_display,
+                elec,
+                int(stable),
+                ai_pros,
+                ai_cons,
+                url,
+            ]
+        )
 
-        marker = folium.Marker(
-            location=[row["latitude"], row["longitude"]],
-            popup=folium.Popup(popup_html, max_width=350),
-            icon=folium.Icon(color=marker_color, icon=icon_type, prefix="fa"),
+        marker_rows.append(
+            [
+                lat,
+                lng,
+                tier,
+                {
+                    "monthly": monthly,
+                    "pros": parse_tags(ai_pros),
+                    "cons": parse_tags(ai_cons),
+                },
+            ]
         )
 
-        # We assign as a standard dictionary
-        marker.options["extraData"] = {
-            "rating": float(row["avg_rating"]),
-            "places": int(num_places),
-            "reviews": int(row["total_reviews"]),
-            "type": str(row["location_type"]),
-            "seasonality": (
-                row["review_seasonality"]
-                if pd.notna(row["review_seasonality"])
-                else "{}"
-            ),
-            "pros": row["ai_pros"] if pd.notna(row["ai_pros"]) else "",
-            "cons": row["ai_cons"] if pd.notna(row["ai_cons"]) else "",
-        }
-        marker.add_to(marker_layer)
+    # Folium only creates the (empty) cluster layer; the page fills it from MARKER_ROWS,
+    # so the marker data never goes through folium's template rendering
+    marker_layer = MarkerCluster(name="MainPropertyLayer")
+    marker_layer.add_to(m)
+    layer_name = marker_layer.get_name()  # Capture internal ID for JS
+
+    # Filter fields as one typed array per column (struct-of-arrays) for the JS filter loop;
+    # ratings stay float64 so slider bounds compare exactly as before
+    filter_js = (
+        f"var FILT_RATING = new Float64Array({to_js(df_clean['avg_rating'].to_numpy())});\n"
+        f"var FILT_PLACES = new Int32Array({to_js(df_clean['num_places'].to_numpy())});\n"
+        f"var FILT_TYPE = new Int16Array({to_js(type_col.codes.to_numpy())});\n"
+        f"var TYPE_NAMES = {to_js(type_col.categories.tolist())};"
+    )
+
+    # Marker rows and popup records ride in their own script block; "</" is escaped so text
+    # cannot close it
+    data_js = (
+        f"var MARKER_ROWS = {to_js(marker_rows)};\n"
+        f"var TIER_STYLES = {to_js(TIER_STYLES)};\n"
+        f"var POPUPS = {to_js(popups)};\n"
+        f"{filter_js}"
+    ).replace("</", "<\\/")
+    m.get_root().html.add_child(raw_element(f"<script>{data_js}</script>"))
 
     strat_box = f"""
     <div id="strat-panel" class="map-overlay" style="bottom: 20px; left: 20px; width: 280px; border-left: 5px solid #f1c40f; position: fixed; z-index: 9999; background: white; padding: 15px; border-radius: 12px; box-shadow: 0 4px 20px rgba(0,0,0,0.2); font-family: sans-serif;">
@@ -187,12 +370,24 @@ def generate_map(output_file="index.html"):
         #filter-panel {{ top: 20px; right: 20px; width: 250px; max-height: 90vh; }}
         #stats-panel {{ top: 20px; left: 20px; width: 320px; max-height: 70vh; }}
         .stat-section {{ margin-top: 15px; border-top: 1px solid #eee; padding-top: 10px; font-size: 11px; }}
-        .tag-item {{ display: flex; justify-content: space-between; margin-bottom: 2px; }}
+        .tag-item {{ display: flex; justify-content: space-between; margin-bottom: 2px; cursor: pointer; transition: background-color 0.2s; }}
+        .tag-item:hover {{ background-color: #f0f0f0; }}
         .slider-wrap {{ margin: 10px 10px 25px 10px; }}
         .noUi-connect {{ background: #2c3e50; }}
         .noUi-handle {{ width: 18px !important; height: 18px !important; right: -9px !important; top: -5px !important; border-radius: 50%; cursor: pointer; }}
         .noUi-handle:after, .noUi-handle:before {{ display: none; }}
         select[multiple] {{ width: 100%; height: 120px; border-radius: 6px; border: 1px solid #ccc; }}
+        .pp {{ font-family: Arial; width: 320px; font-size: 13px; }}
+        .pp h3 {{ margin: 0; }}
+        .pp-score {{ float: right; background: #eee; padding: 4px; border-radius: 4px; font-weight: bold; }}
+        .pp-score.pp-hot {{ background: #f1c40f; }}
+        .pp-type {{ color: #666; font-style: italic; margin-bottom: 10px; }}
+        .pp-pros {{ margin-top: 10px; border-top: 1px solid #eee; padding-top: 10px; }}
+        .pp-pros b {{ color: green; }}
+        .pp-cons {{ margin-top: 5px; }}
+        .pp-cons b {{ color: #d35400; }}
+        .pp-pros span, .pp-cons span {{ font-size: 11px; }}
+        .pp a {{ display: block; text-align: center; background: #2c3e50; color: white; padding: 8px; border-radius: 4px; text-decoration: none; font-weight: bold; }}
     </style>
 
     {strat_box}
@@ -239,102 +434,152 @@ def generate_map(output_file="index.html"):
     </div>
 
     <script>
-    var markerStore = null;
+    {POPUP_JS}
+
+    {MARKER_JS}
+
+    var markerStore = [];
     var chartInstance = null;
     var sRating, sPlaces;
 
-    function parseThemeString(str) {{
-        const results = {{}};
-        if (!str) return results;
-        str.split(';').forEach(item => {{
-            const match = item.match(/(.+)\\s\\((\\d+)\\)/);
-            if (match) results[match[1].trim()] = parseInt(match[2]);
+    // Trailing-edge debounce so a slider drag re-filters once, not on every tick
+    function debounce(fn, ms) {{
+        let t;
+        return (...args) => {{
+            clearTimeout(t);
+            t = setTimeout(() => fn(...args), ms);
+        }};
+    }}
+
+    // Built once; filter changes only swap the dataset and redraw without animation
+    function initChart() {{
+        const labels = ["01","02","03","04","05","06","07","08","09","10","11","12"];
+        const ctx = document.getElementById('seasonChart').getContext('2d');
+        chartInstance = new Chart(ctx, {{
+            type: 'bar',
+            data: {{ labels, datasets: [{{ label: 'Reviews', data: new Array(12).fill(0), backgroundColor: '#3498db' }}] }},
+            options: {{ animation: false, plugins: {{ legend: {{ display: false }} }}, scales: {{ y: {{ beginAtZero: true }} }} }}
         }});
-        return results;
     }}
 
-    function updateDashboard(activeMarkers) {{
-        let globalSeason = {{}}, globalPros = {{}}, globalCons = {{}};
+    function updateDashboard(activeIdx) {{
+        const globalSeason = new Array(12).fill(0);
+        let globalPros = {{}}, globalCons = {{}};
         let totalPlaces = 0, totalRating = 0;
 
-        activeMarkers.forEach(m => {{
-            const d = m.options.extraData;
-            totalPlaces += d.places;
-            totalRating += d.rating;
+        activeIdx.forEach(i => {{
+            const d = markerStore[i].options.extraData;
+            totalPlaces += FILT_PLACES[i];
+            totalRating += FILT_RATING[i];
 
-            try {{
-                const s = JSON.parse(d.seasonality);
-                for (let date in s) {{
-                    const month = date.split('-')[1];
-                    globalSeason[month] = (globalSeason[month] || 0) + s[date];
-                }}
-            }} catch(e) {{}}
-            
-            const p = parseThemeString(d.pros);
-            for (let k in p) globalPros[k] = (globalPros[k] || 0) + p[k];
-            const c = parseThemeString(d.cons);
-            for (let k in c) globalCons[k] = (globalCons[k] || 0) + c[k];
+            for (let j = 0; j < 12; j++) globalSeason[j] += d.monthly[j];
+
+            for (let k in d.pros) globalPros[k] = (globalPros[k] || 0) + d.pros[k];
+            for (let k in d.cons) globalCons[k] = (globalCons[k] || 0) + d.cons[k];
         }});
 
-        document.getElementById('agg-count').innerText = activeMarkers.length;
+        document.getElementById('agg-count').innerText = activeIdx.length;
         document.getElementById('total-places-count').innerText = totalPlaces.toLocaleString();
-        document.getElementById('avg-rating-count').innerText = activeMarkers.length ? (totalRating / activeMarkers.length).toFixed(2) : 0;
+        document.getElementById('avg-rating-count').innerText = activeIdx.length ? (totalRating / activeIdx.length).toFixed(2) : 0;
 
-        const labels = ["01","02","03","04","05","06","07","08","09","10","11","12"];
-        const ctx = document.getElementById('seasonChart').getContext('2d');
-        if (chartInstance) chartInstance.destroy();
-        chartInstance = new Chart(ctx, {{
-            type: 'bar',
-            data: {{ labels, datasets: [{{ label: 'Reviews', data: labels.map(l => globalSeason[l] || 0), backgroundColor: '#3498db' }}] }},
-            options: {{ plugins: {{ legend: {{ display: false }} }}, scales: {{ y: {{ beginAtZero: true }} }} }}
-        }});
+        if (!chartInstance) initChart();
+        chartInstance.data.datasets[0].data = globalSeason;
+        chartInstance.update('none');
 
-        const renderList = (data, id, type) => {{
-            const sorted = Object.entries(data).sort((a,b) => b[1]-a[1]).filter(([key, value]) => key !== 'misc_general_positive_sentiment');
-            document.getElementById(id).innerHTML = sorted.map(i => 
-                `<div class="tag-item" style="cursor:pointer; transition: background-color 0.2s;" onmouseover="this.style.backgroundColor='#f0f0f0'" onmouseout="this.style.backgroundColor='transparent'" onclick="filterByTag(this.getAttribute('data-tag'), '${{type}}')" data-tag="${{i[0].replace(/"/g, '&quot;')}}"><span>${{i[0]}}</span><b>${{i[1]}}</b></div>`
-            ).join('');
-        }};
         renderList(globalPros, 'top-pros', 'pros');
         renderList(globalCons, 'top-cons', 'cons');
     }}
 
-    function filterByTag(tag, type) {{
+    // Tag rows are created once and reused; updates only rewrite their text, no HTML re-parse
+    const listRows = {{ 'top-pros': [], 'top-cons': [] }};
+
+    function renderList(data, id, type) {{
+        const sorted = Object.entries(data).filter(([key]) => key !== 'misc_general_positive_sentiment').sort((a, b) => b[1] - a[1]);
+        const rows = listRows[id];
+        if (rows.length < sorted.length) {{
+            const frag = document.createDocumentFragment();
+            while (rows.length < sorted.length) {{
+                const row = document.createElement('div');
+                row.className = 'tag-item';
+                row.appendChild(document.createElement('span'));
+                row.appendChild(document.createElement('b'));
+                row.addEventListener('click', () => filterByTag(row.dataset.tag, type));
+                rows.push(row);
+                frag.appendChild(row);
+            }}
+            document.getElementById(id).appendChild(frag);
+        }}
+        rows.forEach((row, i) => {{
+            if (i < sorted.length) {{
+                row.dataset.tag = sorted[i][0];
+                row.firstChild.textContent = sorted[i][0];
+                row.lastChild.textContent = sorted[i][1];
+                row.style.display = '';
+            }} else {{
+                row.style.display = 'none';
+            }}
+        }});
+    }}
+
+    // Visibility mask over markerStore; filters only add/remove the markers whose state changed
+    // instead of clearing the cluster layer and re-inserting every match
+    let visible = null;
+
+    // Last 32 filter results keyed by their settings (LRU), so revisiting one skips the scan;
+    // re-applying the filter already on screen does nothing at all
+    const filterCache = new Map();
+    let shownKey = null;
+
+    function showMatching(key, test) {{
+        if (key === shownKey) return;
+        let hit = filterCache.get(key);
+        if (hit) {{
+            filterCache.delete(key);
+        }} else {{
+            const mask = new Uint8Array(markerStore.length), active = [];
+            for (let i = 0; i < markerStore.length; i++) {{
+                if (test(i)) {{
+                    mask[i] = 1;
+                    active.push(i);
+                }}
+            }}
+            hit = {{ mask, active }};
+            if (filterCache.size >= 32) filterCache.delete(filterCache.keys().next().value);
+        }}
+        filterCache.set(key, hit);
+        shownKey = key;
+
         const targetLayer = {layer_name};
-        if (!markerStore) {{
-            markerStore = targetLayer.getLayers();
+        if (!visible) visible = new Uint8Array(markerStore.length).fill(1);
+
+        const toAdd = [], toRemove = [];
+        for (let i = 0; i < markerStore.length; i++) {{
+            if (hit.mask[i] !== visible[i]) {{
+                (hit.mask[i] ? toAdd : toRemove).push(markerStore[i]);
+                visible[i] = hit.mask[i];
+            }}
         }}
 
-        targetLayer.clearLayers();
-        const filtered = markerStore.filter(m => {{
-            const d = m.options.extraData;
-            const tags = parseThemeString(d[type]);
-            return tags && tags.hasOwnProperty(tag);
-        }});
+        if (toRemove.length) targetLayer.removeLayers(toRemove);
+        if (toAdd.length) targetLayer.addLayers(toAdd);
+        updateDashboard(hit.active);
+    }}
 
-        filtered.forEach(m => targetLayer.addLayer(m));
-        updateDashboard(filtered);
+    function filterByTag(tag, type) {{
+        showMatching(`tag|${{type}}|${{tag}}`, i => markerStore[i].options.extraData[type].hasOwnProperty(tag));
     }}
 
     function applyFilters() {{
         const [minR, maxR] = sRating.noUiSlider.get().map(parseFloat);
         const [minP, maxP] = sPlaces.noUiSlider.get().map(Number);
         const selTypes = Array.from(document.getElementById('sel-type').selectedOptions).map(o => o.value);
+        const allTypes = selTypes.includes("All") || selTypes.length === 0;
+        // Selected names become a per-code lookup table, so the loop only indexes ints
+        const typeOn = new Uint8Array(TYPE_NAMES.length);
+        selTypes.forEach(t => {{ const c = TYPE_NAMES.indexOf(t); if (c >= 0) typeOn[c] = 1; }});
 
-        const targetLayer = {layer_name};
-        if (!markerStore) {{
-            markerStore = targetLayer.getLayers();
-        }}
-
-        targetLayer.clearLayers();
-        const filtered = markerStore.filter(m => {{
-            const d = m.options.extraData;
-            const typeMatch = selTypes.includes("All") || selTypes.includes(d.type) || selTypes.length === 0;
-            return d.rating >= minR && d.rating <= maxR && d.places >= minP && d.places <= maxP && typeMatch;
-        }});
-
-        filtered.forEach(m => targetLayer.addLayer(m));
-        updateDashboard(filtered);
+        const key = [minR, maxR, minP, maxP, allTypes ? 'All' : selTypes.join(',')].join('|');
+        showMatching(key, i => FILT_RATING[i] >= minR && FILT_RATING[i] <= maxR && FILT_PLACES[i] >= minP && FILT_PLACES[i] <= maxP && (allTypes || typeOn[FILT_TYPE[i]] === 1));
     }}
 
     function resetFilters() {{
@@ -345,7 +590,14 @@ def generate_map(output_file="index.html"):
         applyFilters();
     }}
     
+    // The map script that creates the cluster layer comes after this block, so fill it once parsing is done
+    document.addEventListener('DOMContentLoaded', () => {{
+        {layer_name}.addLayers(MARKER_ROWS.map(makeMarker));
+    }});
+
     window.onload = () => {{
+        initChart();
+
         sRating = document.getElementById('slider-rating');
         noUiSlider.create(sRating, {{ start: [0, 5], connect: true, step: 0.1, range: {{'min': 0, 'max': 5}} }});
         sRating.noUiSlider.on('update', v => document.getElementById('lbl-rating').innerText = parseFloat(v[0]).toFixed(1) + ' - ' + parseFloat(v[1]).toFixed(1));
@@ -354,17 +606,26 @@ def generate_map(output_file="index.html"):
         noUiSlider.create(sPlaces, {{ start: [0, {max_p_limit}], connect: true, step: 1, range: {{'min': 0, 'max': {max_p_limit}}} }});
         sPlaces.noUiSlider.on('update', v => document.getElementById('lbl-places').innerText = parseInt(v[0]) + ' - ' + parseInt(v[1]));
 
+        const liveApply = debounce(applyFilters, 200);
+        sRating.noUiSlider.on('slide', liveApply);
+        sPlaces.noUiSlider.on('slide', liveApply);
+        document.getElementById('sel-type').addEventListener('change', liveApply);
+
         setTimeout(() => {{
-            const layer = {layer_name};
-            if (layer) {{
-                updateDashboard(layer.getLayers());
-            }}
+            updateDashboard(markerStore.map((m, i) => i));
         }}, 1000);
     }};
     </script>
     """
-    m.get_root().html.add_child(folium.Element(ui_html))
-    m.save(output_file)
+    # Page-specific markup skips folium's templating too, so memo text with "{{" cannot break it
+    m.get_root().html.add_child(raw_element(ui_html))
+
+    page = m.get_root().render().encode("utf-8")
+    with open(output_file, "wb") as f:
+        f.write(page)
+
+    with open(meta_file, "w") as f:
+        f.write(fingerprint)
 
 
 if __name__ == "__main__":